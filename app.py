@@ -3,58 +3,158 @@ import os
 for var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']:
     if var in os.environ:
         del os.environ[var]
-from flask import Flask, render_template, request, jsonify
-import os
+from flask import Flask, Response, render_template, request, jsonify, make_response
+from flask.json.provider import JSONProvider
+import logging
+import threading
+import orjson
 from dotenv import load_dotenv
+from werkzeug.exceptions import HTTPException
 
 # Load environment variables
 load_dotenv()
 
+# Send the auditor's warnings and queue-depth messages to stderr, where gunicorn
+# and Heroku collect them
+_log_level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+logging.basicConfig(
+    level=_log_level if isinstance(_log_level, int) else logging.INFO,
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
+class ORJSONProvider(JSONProvider):
+    """Serialize JSON responses with orjson instead of the stdlib json module"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Larger submissions are rejected before spending an API call on them
+MAX_CODE_BYTES = 64 * 1024
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Let Werkzeug reject oversized bodies before reading them; the headroom covers
+# JSON escaping and the other request fields
+app.config['MAX_CONTENT_LENGTH'] = MAX_CODE_BYTES + 16 * 1024
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({
+        'error': f'Request is too large. The code limit is {MAX_CODE_BYTES} bytes.'
+    }), 413
+
+# The auditor (and its OpenAI connection pool) is created lazily, once per
+# process, so worker startup never blocks on it and requests share one client
+_auditor = None
+_auditor_initialized = False
+_auditor_lock = threading.Lock()
 
-# Try to initialize auditor, but don't fail if it doesn't work
-auditor = None
-try:
-    from auditor.analyzer import CodeAuditor
-    auditor = CodeAuditor(os.getenv('OPENAI_API_KEY'))
-    print("✅ CodeAuditor initialized successfully")
-except Exception as e:
-    print(f"⚠️  Failed to initialize CodeAuditor: {e}")
+def get_auditor():
+    """Return the process-wide auditor, or None if it couldn't be initialized"""
+    global _auditor, _auditor_initialized
+    if _auditor_initialized:
+        return _auditor
+    
+    with _auditor_lock:
+        if not _auditor_initialized:
+            # Try to initialize auditor, but don't fail if it doesn't work
+            try:
+                from auditor import CodeAuditor, BatchingAuditor
+                auditor = CodeAuditor(os.getenv('OPENAI_API_KEY'))
+                
+                # Optionally coalesce concurrent /analyze requests into shared OpenAI calls
+                batch_size = int(os.getenv('AUDIT_BATCH_SIZE', '1'))
+                if batch_size > 1:
+                    auditor = BatchingAuditor(
+                        auditor,
+                        max_batch=batch_size,
+                        max_wait_ms=int(os.getenv('AUDIT_BATCH_WAIT_MS', '50'))
+                    )
+                _auditor = auditor
+                print("✅ CodeAuditor initialized successfully")
+            except Exception as e:
+                print(f"⚠️  Failed to initialize CodeAuditor: {e}")
+            _auditor_initialized = True
+    
+    return _auditor
+
+# Static response bodies, built on first use and reused for every later hit
+_INDEX_HTML = None
+_HEALTH = None
 
 @app.route('/')
 def index():
-    try:
-        return render_template('index.html')
-    except Exception as e:
-        return f"<h1>AuditAI</h1><p>App is running but template not found: {e}</p>"
+    global _INDEX_HTML
+    if _INDEX_HTML is None:
+        try:
+            _INDEX_HTML = render_template('index.html')
+        except Exception as e:
+            return f"<h1>AuditAI</h1><p>App is running but template not found: {e}</p>"
+    
+    response = make_response(_INDEX_HTML)
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
+    global _HEALTH
+    if _HEALTH is None:
+        # Availability is fixed once the auditor has been initialized
+        _HEALTH = orjson.dumps({
+            'status': 'healthy',
+            'auditor_available': get_auditor() is not None,
+            'openai_key_present': bool(os.getenv('OPENAI_API_KEY'))
+        })
+    
+    response = Response(_HEALTH, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@app.route('/stats')
+def stats():
+    """Audit cache statistics"""
+    auditor = get_auditor()
     return jsonify({
-        'status': 'healthy',
-        'auditor_available': auditor is not None,
-        'openai_key_present': bool(os.getenv('OPENAI_API_KEY'))
+        'audit_cache': auditor.cache_stats() if auditor else None
     })
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     try:
+        auditor = get_auditor()
         if not auditor:
             return jsonify({
                 'error': 'Code auditor is not available. Check server logs for details.'
             }), 500
         
-        data = request.json
+        try:
+            data = orjson.loads(request.get_data())
+        except orjson.JSONDecodeError:
+            data = None
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
             
         code = data.get('code', '')
         platform = data.get('platform', 'unknown')
         
         if not code:
             return jsonify({'error': 'Code is required'}), 400
+        if not isinstance(code, str):
+            return jsonify({'error': 'Code must be a string'}), 400
+        
+        code_bytes = len(code.encode())
+        if code_bytes > MAX_CODE_BYTES:
+            return jsonify({
+                'error': f'Code is too large ({code_bytes} bytes). The limit is {MAX_CODE_BYTES} bytes.'
+            }), 413
         
         # Call the audit_code method
         result = auditor.audit_code(code, platform)
@@ -65,13 +165,16 @@ def analyze():
             'complexity_score': result.complexity_score,
             'bug_count': result.bug_count,
             'optimization_suggestions': result.optimization_suggestions,
-            'cost_analysis': result.cost_analysis,
+            'cost_analysis': dict(result.cost_analysis),
             'red_flags': result.red_flags,
             'summary': result.summary
         }
         
         return jsonify(result_dict)
     
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH - let the registered error handler respond
+        raise
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
@@ -1,7 +1,100 @@
 import os
+import ast
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import httpx
 import openai
-from typing import Dict, List, Any
+import orjson
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from .models import AuditResult, PlatformPatterns
+from .ratelimit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Simultaneous OpenAI requests allowed when OPENAI_MAX_CONCURRENCY is unset or invalid
+DEFAULT_MAX_CONCURRENCY = 20
+
+# Maximum number of audit results kept in the in-memory LRU cache
+AUDIT_CACHE_SIZE = 1024
+
+MODEL = "gpt-4o-mini"
+
+# JSON is compact, so the analysis fits comfortably in a smaller completion budget
+MAX_COMPLETION_TOKENS = 800
+
+# Long sources are sent to the model as head + tail slices of this many characters
+LLM_HEAD = 4000
+LLM_TAIL = 4000
+TRUNCATION_MARKER = "\n...[TRUNCATED]...\n"
+
+SYSTEM_PROMPT = "You are an expert code auditor and security analyst."
+
+AUDIT_JSON_SCHEMA = (
+    '{"efficiency_score": int, "complexity_score": int, "bugs": [str], '
+    '"optimizations": [str], "red_flags": [str], "summary": str}'
+)
+
+AUDIT_SYSTEM_PROMPT = f"{SYSTEM_PROMPT} Respond ONLY with JSON matching this schema: {AUDIT_JSON_SCHEMA}"
+
+_AUDIT_PROMPT_TEMPLATE = """
+Please audit this {language} code and provide a detailed analysis:
+
+CODE:
+{code}
+
+Please analyze for:
+1. Code efficiency (score 1-100)
+2. Complexity score (1-10, where 10 is most complex)
+3. Potential bugs or issues
+4. Optimization suggestions
+5. Cost analysis (performance, maintainability)
+6. Security red flags
+7. Overall summary
+
+{platform_context}
+
+Report each point using the fields of the JSON schema.
+"""
+
+class _NestingVisitor(ast.NodeVisitor):
+    """Tracks the deepest nesting of block statements in a Python AST"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.max_depth = 0
+    
+    def _visit_block(self, statements: List[ast.stmt]) -> None:
+        if not statements:
+            return
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        for statement in statements:
+            self.visit(statement)
+        self.depth -= 1
+    
+    def _enter(self, node: ast.AST) -> None:
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        self.generic_visit(node)
+        self.depth -= 1
+    
+    visit_For = visit_AsyncFor = visit_While = _enter
+    visit_With = visit_AsyncWith = visit_Try = visit_TryStar = _enter
+    # `case` blocks sit one level inside `match`, and their bodies one level deeper
+    visit_Match = visit_match_case = _enter
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _enter
+    
+    def visit_If(self, node: ast.If) -> None:
+        self.visit(node.test)
+        self._visit_block(node.body)
+        if len(node.orelse) == 1 and isinstance(node.orelse[0], ast.If):
+            # `elif` is an If nested in orelse, but sits at the same depth
+            self.visit(node.orelse[0])
+        else:
+            self._visit_block(node.orelse)
 
 class CodeAuditor:
     def __init__(self, api_key: str = None):
@@ -10,97 +103,310 @@ class CodeAuditor:
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
         
+        # Shared connection pool so TCP/TLS connections are reused across audits.
+        # Passing our own http_client also avoids the 'proxies' TypeError raised
+        # when openai builds its default client against newer httpx releases.
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=30
+        )
+        
         # Initialize OpenAI client (v1.0+ compatible)
-        self.client = openai.OpenAI(api_key=self.api_key)
+        self.client = openai.OpenAI(api_key=self.api_key, http_client=self._http)
+        
+        # Queue requests locally instead of hitting OpenAI's 429s (OPENAI_RPM / OPENAI_TPM)
+        self.rate_limiter = RateLimiter.from_env()
+        
+        # Cap simultaneous OpenAI requests so bursts queue here instead of piling onto the API
+        self.max_concurrency = self._max_concurrency_from_env()
+        self._openai_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+        
+        # LRU cache of completed audits keyed by (code hash, platform, language)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Audits currently in progress, so identical concurrent requests share one call
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
     
     def audit_code(self, code: str, platform: str = None, language: str = "python") -> AuditResult:
         """Audit the provided code and return detailed analysis"""
+        if platform is not None:
+            # Platform comes straight from the request JSON and may be any type
+            platform = str(platform)
+        key = self._cache_key(code, platform, language)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+        
+        return self._single_flight(key, lambda: self._audit_and_store(key, code, platform, language))
+    
+    def _audit_and_store(self, key: tuple, code: str, platform: str, language: str) -> AuditResult:
+        result, ok = self._audit_uncached(code, platform, language)
+        if ok:
+            # Only successful API analyses are cached; fallbacks should be retried
+            self._cache_store(key, result)
+        return result
+    
+    def _single_flight(self, key: tuple, audit: Callable[[], AuditResult]) -> AuditResult:
+        """Run audit() once per key; concurrent callers with the same key wait for that result"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not leader:
+            return future.result()
+        
         try:
-            # Get platform-specific patterns if specified
-            platform_patterns = PlatformPatterns.get_patterns(platform) if platform else []
-            
-            # Create the audit prompt
-            prompt = self._create_audit_prompt(code, platform_patterns, language)
+            result = audit()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for the audit cache"""
+        with self._cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "size": len(self._cache),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_ratio": round(self.cache_hits / lookups, 3) if lookups else 0.0
+            }
+    
+    def _cache_key(self, code: str, platform: str, language: str) -> tuple:
+        """Build a compact cache key so the full source isn't retained by the cache"""
+        code_hash = hashlib.blake2b(code.encode(), digest_size=16).hexdigest()
+        return (code_hash, (platform or "").lower(), language)
+    
+    def _cache_lookup(self, key: tuple):
+        """Return a cached AuditResult (marking it most recently used) or None"""
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return result
+    
+    def _cache_store(self, key: tuple, result: AuditResult) -> None:
+        """Insert a result, evicting the least recently used entry when full"""
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            if len(self._cache) > AUDIT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    def _audit_uncached(self, code: str, platform: str, language: str):
+        """Run the OpenAI audit; returns (result, ok) where ok is False for fallbacks"""
+        try:
+            # Create the audit prompt (with platform-specific patterns if specified)
+            prompt = self._create_audit_prompt(code, platform, language)
             
             # Get analysis from OpenAI
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert code auditor and security analyst."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.1
-            )
+            analysis = self._complete(AUDIT_SYSTEM_PROMPT, prompt)
             
             # Parse the response
-            analysis = response.choices[0].message.content
-            return self._parse_analysis(analysis, code)
+            return self._parse_analysis(analysis, code), True
             
         except Exception as e:
             # Fallback analysis in case of API issues
-            return self._fallback_analysis(code, str(e))
+            return self._fallback_analysis(code, str(e)), False
+    
+    def _complete(self, system: str, prompt: str, max_tokens: int = MAX_COMPLETION_TOKENS) -> str:
+        """Stream a JSON-mode chat completion and return the response text"""
+        if self.rate_limiter is not None:
+            # Rough heuristic: ~4 characters per token, plus the completion budget
+            self.rate_limiter.acquire(estimated_tokens=(len(system) + len(prompt)) // 4 + max_tokens)
+        
+        self._acquire_openai_slot()
+        try:
+            stream = self.client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=0.1,
+                response_format={"type": "json_object"},
+                stream=True
+            )
+            with stream:
+                content, finish_reason = self._read_stream(stream)
+        finally:
+            self._openai_slots.release()
+        
+        if finish_reason == "length":
+            # The JSON was cut off at max_tokens and can't be parsed reliably
+            raise ValueError(f"OpenAI response truncated at {max_tokens} tokens")
+        if finish_reason != "stop" or not content:
+            # e.g. content_filter, or an empty reply - not an analysis we can use
+            raise ValueError(f"OpenAI returned no usable analysis (finish_reason={finish_reason!r})")
+        return content
     
-    def _create_audit_prompt(self, code: str, platform_patterns: List[str], language: str) -> str:
+    @staticmethod
+    def _read_stream(stream) -> Tuple[str, Optional[str]]:
+        """Collect streamed text, stopping as soon as it forms a complete JSON object
+        
+        The finish_reason arrives on the final chunk. JSON mode can keep emitting
+        whitespace after the closing brace until max_tokens, so a reply that
+        already parses is treated as finished and the rest of the stream dropped.
+        """
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            text = choice.delta.content
+            if text:
+                parts.append(text)
+            if choice.finish_reason is not None:
+                return "".join(parts), choice.finish_reason
+            if text and text.rstrip().endswith("}"):
+                try:
+                    orjson.loads("".join(parts))
+                except orjson.JSONDecodeError:
+                    continue
+                return "".join(parts), "stop"
+        # The stream ended without a finish_reason - the connection was cut short
+        return "".join(parts), None
+    
+    def _max_concurrency_from_env(self) -> int:
+        """Read OPENAI_MAX_CONCURRENCY, falling back to the default if it isn't a positive integer"""
+        value = os.getenv('OPENAI_MAX_CONCURRENCY')
+        if not value:
+            return DEFAULT_MAX_CONCURRENCY
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            logger.warning(
+                "Invalid OPENAI_MAX_CONCURRENCY=%r (must be an integer >= 1); using %d",
+                value, DEFAULT_MAX_CONCURRENCY
+            )
+            return DEFAULT_MAX_CONCURRENCY
+        return limit
+    
+    def _acquire_openai_slot(self) -> None:
+        """Wait for one of the OPENAI_MAX_CONCURRENCY request slots, logging the queue depth"""
+        if self._openai_slots.acquire(blocking=False):
+            return
+        
+        with self._queued_lock:
+            self._queued += 1
+            depth = self._queued
+        logger.info("OpenAI concurrency limit (%d) reached; %d request(s) queued", self.max_concurrency, depth)
+        
+        try:
+            self._openai_slots.acquire()
+        finally:
+            with self._queued_lock:
+                self._queued -= 1
+    
+    def _create_audit_prompt(self, code: str, platform: str, language: str) -> str:
         """Create a detailed prompt for code analysis"""
-        platform_context = ""
-        if platform_patterns:
-            platform_context = f"\nAlso check for these platform-specific issues: {', '.join(platform_patterns)}"
+        platform_context = PlatformPatterns.get_prompt_context(platform) if platform else ""
         
-        return f"""
-Please audit this {language} code and provide a detailed analysis:
-
-CODE:
-{code}
-
-Please analyze for:
-1. Code efficiency (score 1-100)
-2. Complexity score (1-10, where 10 is most complex)
-3. Potential bugs or issues
-4. Optimization suggestions
-5. Cost analysis (performance, maintainability)
-6. Security red flags
-7. Overall summary
-
-{platform_context}
-
-Format your response as structured analysis covering all these points.
-"""
+        return _AUDIT_PROMPT_TEMPLATE.format(
+            language=language,
+            code=self._truncate_for_prompt(code),
+            platform_context=platform_context
+        )
     
     def _parse_analysis(self, analysis: str, code: str) -> AuditResult:
         """Parse the AI analysis into structured AuditResult"""
-        # Basic parsing - in production, you'd want more sophisticated parsing
-        lines = analysis.split('\n')
-        
-        # Default values
-        efficiency_score = self._extract_score(analysis, "efficiency", 75)
-        complexity_score = self._extract_score(analysis, "complexity", 5)
-        bug_count = self._count_bugs(analysis)
-        optimization_suggestions = self._extract_suggestions(analysis)
-        red_flags = self._extract_red_flags(analysis)
-        summary = self._extract_summary(analysis)
-        
-        # Simple cost analysis
-        cost_analysis = {
-            "lines_of_code": len(code.split('\n')),
-            "estimated_runtime": "medium" if len(code) > 1000 else "low",
-            "maintainability": "good" if efficiency_score > 70 else "needs_improvement"
-        }
+        # Anything that isn't a JSON object raises here, so the audit is treated as failed and not cached
+        return self._result_from_json(orjson.loads(analysis), code)
+    
+    def _result_from_json(self, data: Dict[str, Any], code: str) -> AuditResult:
+        """Build an AuditResult from the model's JSON analysis"""
+        if not isinstance(data, dict):
+            raise TypeError("Expected a JSON object")
+        
+        efficiency_score = min(100, max(1, int(data.get("efficiency_score", 75))))
+        complexity_score = min(10, max(1, int(data.get("complexity_score", 5))))
+        bugs = self._string_list(data.get("bugs"))
         
         return AuditResult(
             efficiency_score=efficiency_score,
             complexity_score=complexity_score,
-            bug_count=bug_count,
-            optimization_suggestions=optimization_suggestions,
-            cost_analysis=cost_analysis,
-            red_flags=red_flags,
-            summary=summary
+            bug_count=min(len(bugs), 10),  # Cap at 10 for reasonableness
+            optimization_suggestions=self._string_list(data.get("optimizations"))[:5],
+            cost_analysis=self._cost_analysis(code, efficiency_score),
+            red_flags=self._string_list(data.get("red_flags"))[:3],
+            summary=str(data.get("summary") or "").strip()
+                or "Code analysis completed. Review detailed metrics for insights."
         )
     
+    def _string_list(self, value: Any) -> List[str]:
+        """Coerce a JSON field into a list of non-empty strings"""
+        if not isinstance(value, list):
+            return []
+        return [str(item).strip() for item in value if str(item).strip()]
+    
+    def _truncate_for_prompt(self, code: str) -> str:
+        """Keep only the head and tail of long sources to bound prompt tokens"""
+        if len(code) <= LLM_HEAD + LLM_TAIL:
+            return code
+        return code[:LLM_HEAD] + TRUNCATION_MARKER + code[-LLM_TAIL:]
+    
+    def _cost_analysis(self, code: str, efficiency_score: int) -> Dict[str, Any]:
+        """Simple cost analysis computed locally from the full source"""
+        return {
+            "lines_of_code": code.count('\n') + 1,
+            "max_nesting_depth": self._calculate_complexity(code),
+            "estimated_runtime": "medium" if len(code) > 1000 else "low",
+            "maintainability": "good" if efficiency_score > 70 else "needs_improvement",
+            "truncated_for_analysis": len(code) > LLM_HEAD + LLM_TAIL
+        }
+    
+    def _calculate_complexity(self, code: str) -> int:
+        """Compute the deepest block nesting, using the AST when the code is valid Python"""
+        try:
+            visitor = _NestingVisitor()
+            visitor.visit(ast.parse(code))
+            return visitor.max_depth
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            # Not valid Python, or nested too deeply to walk - estimate from indentation instead
+            return self._indentation_depth(code)
+    
+    def _indentation_depth(self, code: str) -> int:
+        """Estimate the deepest block nesting from indentation"""
+        indents = [0]
+        max_depth = 0
+        
+        for line in code.expandtabs(4).splitlines():
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith(('#', '//')):
+                continue
+            
+            indent = len(line) - len(stripped)
+            while indent < indents[-1]:
+                indents.pop()
+            if indent > indents[-1]:
+                indents.append(indent)
+            max_depth = max(max_depth, len(indents) - 1)
+        
+        return max_depth
+    
     def _fallback_analysis(self, code: str, error_msg: str) -> AuditResult:
         """Provide basic analysis when API is unavailable"""
-        lines = code.split('\n')
-        non_empty_lines = [line for line in lines if line.strip()]
+        non_empty_lines = [line for line in code.splitlines() if line.strip()]
         
         return AuditResult(
             efficiency_score=70,  # Default moderate score
@@ -112,6 +418,7 @@ Format your response as structured analysis covering all these points.
             ],
             cost_analysis={
                 "lines_of_code": len(non_empty_lines),
+                "max_nesting_depth": self._calculate_complexity(code),
                 "estimated_runtime": "unknown",
                 "maintainability": "requires_analysis",
                 "api_error": error_msg
@@ -119,74 +426,3 @@ Format your response as structured analysis covering all these points.
             red_flags=["API analysis unavailable"],
             summary=f"Basic analysis: {len(non_empty_lines)} lines of code. Full analysis unavailable due to API issues."
         )
-    
-    def _extract_score(self, text: str, score_type: str, default: int) -> int:
-        """Extract numeric scores from analysis text"""
-        import re
-        pattern = rf"{score_type}.*?(\d+)"
-        match = re.search(pattern, text.lower())
-        if match:
-            return min(100, max(1, int(match.group(1))))
-        return default
-    
-    def _count_bugs(self, text: str) -> int:
-        """Count potential bugs mentioned in analysis"""
-        bug_keywords = ["bug", "issue", "problem", "error", "vulnerability"]
-        count = 0
-        for keyword in bug_keywords:
-            count += text.lower().count(keyword)
-        return min(count, 10)  # Cap at 10 for reasonableness
-    
-    def _extract_suggestions(self, text: str) -> List[str]:
-        """Extract optimization suggestions from analysis"""
-        suggestions = []
-        lines = text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if any(word in line.lower() for word in ['suggest', 'recommend', 'improve', 'optimize', 'consider']):
-                if len(line) > 10:  # Avoid very short lines
-                    suggestions.append(line)
-        
-        # Default suggestions if none found
-        if not suggestions:
-            suggestions = [
-                "Consider adding error handling",
-                "Review variable naming conventions",
-                "Add documentation and comments"
-            ]
-        
-        return suggestions[:5]  # Limit to 5 suggestions
-    
-    def _extract_red_flags(self, text: str) -> List[str]:
-        """Extract security and quality red flags"""
-        red_flags = []
-        flag_keywords = ["security", "vulnerable", "risk", "dangerous", "warning", "critical"]
-        
-        lines = text.split('\n')
-        for line in lines:
-            if any(keyword in line.lower() for keyword in flag_keywords):
-                if len(line.strip()) > 10:
-                    red_flags.append(line.strip())
-        
-        return red_flags[:3]  # Limit to 3 most important flags
-    
-    def _extract_summary(self, text: str) -> str:
-        """Extract or generate summary from analysis"""
-        lines = text.split('\n')
-        
-        # Look for summary section
-        for i, line in enumerate(lines):
-            if 'summary' in line.lower():
-                # Get next few lines
-                summary_lines = lines[i+1:i+4]
-                summary = ' '.join([l.strip() for l in summary_lines if l.strip()])
-                if summary:
-                    return summary
-        
-        # Fallback: use first substantial paragraph
-        for line in lines:
-            if len(line.strip()) > 50:
-                return line.strip()
-        
-        return "Code analysis completed. Review detailed metrics for insights."
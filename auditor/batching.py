@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+import orjson
+from .analyzer import CodeAuditor, SYSTEM_PROMPT, AUDIT_JSON_SCHEMA, MAX_COMPLETION_TOKENS, LLM_HEAD, LLM_TAIL
+from .models import AuditResult
+
+SNIPPET_DELIMITER = "===SNIPPET {index}==="
+
+BATCH_SYSTEM_PROMPT = (
+    SYSTEM_PROMPT + " You will receive {count} code snippets separated by "
+    "`===SNIPPET k===` markers. Audit each snippet independently and respond ONLY "
+    'with a JSON object {{"analyses": [...]}} holding {count} objects in snippet '
+    "order, each matching this schema: {schema}"
+)
+
+# Completion budget per snippet, capped by the model's maximum output length
+TOKENS_PER_SNIPPET = MAX_COMPLETION_TOKENS
+MAX_BATCH_COMPLETION_TOKENS = 4096
+
+
+class _PendingAudit:
+    """A queued audit request waiting for its batch to complete"""
+
+    def __init__(self, code: str, platform: Optional[str], language: str, key: tuple):
+        self.code = code
+        self.platform = platform
+        self.language = language
+        self.key = key
+        self.future = Future()
+
+    def estimated_tokens(self) -> int:
+        # Rough heuristic: ~4 characters per token; long sources are truncated in the prompt
+        return min(len(self.code), LLM_HEAD + LLM_TAIL) // 4 + TOKENS_PER_SNIPPET
+
+
+class BatchingAuditor:
+    """Coalesce concurrent audits into a single OpenAI request
+
+    Requests arriving within ``max_wait_ms`` of each other are sent together
+    (up to ``max_batch`` snippets or ``max_batch_tokens`` estimated tokens) and
+    the response is split back out to each caller. If the batched response
+    can't be parsed, every snippet in the batch falls back to its own call;
+    if the request itself fails, every caller gets the basic local analysis.
+    Batches and fallbacks run on a worker pool sized to the auditor's
+    OpenAI concurrency limit, while the collector keeps draining the queue.
+    """
+
+    def __init__(self, auditor: CodeAuditor, max_batch: int = 4, max_wait_ms: int = 50,
+                 max_batch_tokens: int = 12000):
+        self.auditor = auditor
+        # Never batch more snippets than the completion budget can answer in full
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_COMPLETION_TOKENS // TOKENS_PER_SNIPPET))
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+
+        self._queue = queue.Queue()
+        self._carry = None  # item that didn't fit in the previous batch
+        self._executor = ThreadPoolExecutor(
+            max_workers=auditor.max_concurrency, thread_name_prefix="audit-batch"
+        )
+        self._worker = threading.Thread(target=self._run, name="audit-batcher", daemon=True)
+        self._worker.start()
+
+    def audit_code(self, code: str, platform: str = None, language: str = "python") -> AuditResult:
+        """Audit the provided code, sharing the OpenAI request with concurrent callers"""
+        if platform is not None:
+            platform = str(platform)
+        key = self.auditor._cache_key(code, platform, language)
+        cached = self.auditor._cache_lookup(key)
+        if cached is not None:
+            return cached
+
+        return self.auditor._single_flight(key, lambda: self._enqueue(code, platform, language, key))
+
+    def _enqueue(self, code: str, platform: Optional[str], language: str, key: tuple) -> AuditResult:
+        pending = _PendingAudit(code, platform, language, key)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.auditor.cache_stats()
+
+    def _run(self):
+        """Background loop: collect batches and hand each one to the worker pool"""
+        while True:
+            batch = self._collect_batch()
+            if len(batch) == 1:
+                self._submit(self._audit_single, batch[0])
+            else:
+                self._submit(self._audit_batch, batch)
+
+    def _submit(self, fn, work):
+        """Run fn(work) on the pool, failing the waiters if it raises"""
+        pending_list = work if isinstance(work, list) else [work]
+
+        def run():
+            try:
+                fn(work)
+            except Exception as e:
+                for pending in pending_list:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+
+        self._executor.submit(run)
+
+    def _collect_batch(self) -> List[_PendingAudit]:
+        """Block for the first request, then gather more until the window closes"""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+
+        batch = [first]
+        tokens = first.estimated_tokens()
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            # Keep the combined prompt within the model's context window
+            if tokens + pending.estimated_tokens() > self.max_batch_tokens:
+                self._carry = pending
+                break
+            batch.append(pending)
+            tokens += pending.estimated_tokens()
+
+        return batch
+
+    def _audit_single(self, pending: _PendingAudit):
+        result = self.auditor._audit_and_store(pending.key, pending.code, pending.platform, pending.language)
+        pending.future.set_result(result)
+
+    def _audit_batch(self, batch: List[_PendingAudit]):
+        sections = []
+        for index, pending in enumerate(batch, start=1):
+            prompt = self.auditor._create_audit_prompt(pending.code, pending.platform, pending.language)
+            sections.append(f"{SNIPPET_DELIMITER.format(index=index)}\n{prompt}")
+
+        try:
+            response = self.auditor._complete(
+                BATCH_SYSTEM_PROMPT.format(count=len(batch), schema=AUDIT_JSON_SCHEMA),
+                "\n".join(sections),
+                max_tokens=min(MAX_BATCH_COMPLETION_TOKENS, TOKENS_PER_SNIPPET * len(batch))
+            )
+            analyses = self._split_response(response, len(batch))
+        except ValueError:
+            # Truncated or unusable reply - the snippets may still fit on their own
+            analyses = None
+        except Exception as e:
+            # API or network failure - retrying each snippet would only multiply the load
+            for pending in batch:
+                pending.future.set_result(self.auditor._fallback_analysis(pending.code, str(e)))
+            return
+
+        if analyses is None:
+            # Batched response was malformed - audit each snippet on its own
+            for pending in batch:
+                self._submit(self._audit_single, pending)
+            return
+
+        for pending, analysis in zip(batch, analyses):
+            try:
+                result = self.auditor._result_from_json(analysis, pending.code)
+            except (TypeError, ValueError):
+                self._submit(self._audit_single, pending)
+                continue
+            self.auditor._cache_store(pending.key, result)
+            pending.future.set_result(result)
+
+    def _split_response(self, response: str, count: int) -> Optional[List[Dict[str, Any]]]:
+        """Demultiplex the batched response into one analysis per snippet"""
+        try:
+            analyses = orjson.loads(response).get("analyses")
+        except (AttributeError, ValueError):
+            return None
+
+        if not isinstance(analyses, list) or len(analyses) != count:
+            return None
+        if not all(isinstance(analysis, dict) for analysis in analyses):
+            return None
+        return analyses
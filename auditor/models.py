@@ -1,16 +1,24 @@
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import Any, Mapping, Sequence
 
-@dataclass
+@dataclass(frozen=True)
 class AuditResult:
+    """Immutable audit result; cached instances are shared between callers"""
     efficiency_score: int  # 1-100
     complexity_score: int  # 1-10
     bug_count: int
-    optimization_suggestions: List[str]
-    cost_analysis: Dict[str, Any]
-    red_flags: List[str]
+    optimization_suggestions: Sequence[str]
+    cost_analysis: Mapping[str, Any]
+    red_flags: Sequence[str]
     summary: str
     
+    def __post_init__(self):
+        # Freeze the containers too, so no caller can alter a shared result
+        object.__setattr__(self, 'optimization_suggestions', tuple(self.optimization_suggestions))
+        object.__setattr__(self, 'red_flags', tuple(self.red_flags))
+        object.__setattr__(self, 'cost_analysis', MappingProxyType(dict(self.cost_analysis)))
+    
 class PlatformPatterns:
     """Known patterns and issues for different AI coding platforms"""
     
@@ -32,11 +40,20 @@ class PlatformPatterns:
         "unnecessary abstractions"
     ]
     
+    _PLATFORM_MAP = {
+        'replit': REPLIT_PATTERNS,
+        'lovable': LOVABLE_PATTERNS,
+        'cursor': CURSOR_PATTERNS
+    }
+    
+    # Comma-joined pattern lists and the prompt lines built from them, computed once
+    _JOINED = {platform: ", ".join(patterns) for platform, patterns in _PLATFORM_MAP.items()}
+    _PROMPT_CONTEXTS = {
+        platform: f"\nAlso check for these platform-specific issues: {joined}"
+        for platform, joined in _JOINED.items()
+    }
+    
     @classmethod
-    def get_patterns(cls, platform: str) -> List[str]:
-        platform_map = {
-            'replit': cls.REPLIT_PATTERNS,
-            'lovable': cls.LOVABLE_PATTERNS,
-            'cursor': cls.CURSOR_PATTERNS
-        }
-        return platform_map.get(platform.lower(), [])
+    def get_prompt_context(cls, platform: str) -> str:
+        """Return the platform-specific prompt line, or "" for unknown platforms"""
+        return cls._PROMPT_CONTEXTS.get(platform.lower(), "")
@@ -0,0 +1,94 @@
+import os
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token-bucket limiter for OpenAI requests-per-minute and tokens-per-minute
+
+    Callers block in ``acquire`` until both buckets have capacity, so bursts
+    queue up locally instead of being rejected by OpenAI with a 429. Either
+    limit can be ``None`` to leave that dimension unbounded.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.max_requests = requests_per_minute
+        self.max_tokens = tokens_per_minute
+        self.available_request_tokens = float(requests_per_minute or 0)
+        self.available_token_tokens = float(tokens_per_minute or 0)
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        """Build a limiter from OPENAI_RPM / OPENAI_TPM, or None if neither is set
+
+        The buckets live in this process, so under gunicorn each worker gets
+        the full budget; set the limits to the account quota divided by the
+        number of workers.
+        """
+        rpm = cls._limit_from_env('OPENAI_RPM')
+        tpm = cls._limit_from_env('OPENAI_TPM')
+        if not rpm and not tpm:
+            return None
+        return cls(rpm, tpm)
+
+    @staticmethod
+    def _limit_from_env(name: str) -> Optional[int]:
+        """Read a per-minute limit, treating anything but a positive integer as unset"""
+        value = os.getenv(name)
+        if not value:
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            logger.warning("Invalid %s=%r (must be an integer >= 1); leaving it unlimited", name, value)
+            return None
+        return limit
+
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        """Block until one request and ``estimated_tokens`` tokens are available"""
+        if self.max_tokens:
+            # A single request larger than the whole bucket would wait forever
+            estimated_tokens = min(estimated_tokens, self.max_tokens)
+
+        while True:
+            with self._lock:
+                self._refill()
+                wait = max(
+                    self._wait_time(self.max_requests, self.available_request_tokens, 1),
+                    self._wait_time(self.max_tokens, self.available_token_tokens, estimated_tokens)
+                )
+                if wait <= 0:
+                    if self.max_requests:
+                        self.available_request_tokens -= 1
+                    if self.max_tokens:
+                        self.available_token_tokens -= estimated_tokens
+                    return
+            time.sleep(wait)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        if self.max_requests:
+            self.available_request_tokens = min(
+                self.max_requests, self.available_request_tokens + self.max_requests * elapsed / 60.0
+            )
+        if self.max_tokens:
+            self.available_token_tokens = min(
+                self.max_tokens, self.available_token_tokens + self.max_tokens * elapsed / 60.0
+            )
+
+    @staticmethod
+    def _wait_time(limit: Optional[int], available: float, needed: float) -> float:
+        """Seconds until ``needed`` units are available in a bucket refilling at ``limit``/minute"""
+        if not limit or available >= needed:
+            return 0.0
+        return (needed - available) * 60.0 / limit
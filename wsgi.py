@@ -0,0 +1,6 @@
+# Patch blocking sockets before anything else imports them, so OpenAI HTTP
+# calls yield to the gevent hub instead of tying up the worker.
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402